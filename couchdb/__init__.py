@@ -12,6 +12,12 @@ from .http import HTTPError, PreconditionFailed, Resource, \
         Unauthorized, Forbidden
 
 try:
-    __version__ = __import__('pkg_resources').get_distribution('CouchDB').version
+    try:
+        from importlib.metadata import version as _version
+    except ImportError:
+        # pkg_resources is slow to import, only use it for older Pythons
+        _version = lambda name: \
+            __import__('pkg_resources').get_distribution(name).version
+    __version__ = _version('CouchDB')
 except:
     __version__ = '?'
@@ -24,14 +24,12 @@ False
 """
 
 import itertools
-import mimetypes
 import os
 from types import FunctionType
-from inspect import getsource
-from textwrap import dedent
 import warnings
 import sys
 import socket
+import time
 
 from couchdb import http, json, util
 
@@ -40,6 +38,8 @@ __docformat__ = 'restructuredtext en'
 
 
 DEFAULT_BASE_URL = os.environ.get('COUCHDB_URL', 'http://localhost:5984/')
+OPEN_REVS_BATCH = 100
+USER_PREFIX = 'org.couchdb.user:'
 
 
 class Server(object):
@@ -71,21 +71,27 @@ class Server(object):
     >>> del server['python-tests']
     """
 
-    def __init__(self, url=DEFAULT_BASE_URL, full_commit=True, session=None):
+    def __init__(self, url=DEFAULT_BASE_URL, full_commit=True, session=None,
+                 exists_ttl=None):
         """Initialize the server object.
 
         :param url: the URI of the server (for example
                     ``http://localhost:5984/``)
         :param full_commit: turn on the X-Couch-Full-Commit header
         :param session: an http.Session instance or None for a default session
+        :param exists_ttl: number of seconds for which the existence of a
+                           database is remembered after it has been checked,
+                           or `None` to always ask the server (the default)
         """
         if isinstance(url, util.strbase):
-            self.resource = http.Resource(url, session or http.Session())
+            self.resource = http.Resource(url, session)
         else:
             self.resource = url # treat as a Resource object
         if not full_commit:
             self.resource.headers['X-Couch-Full-Commit'] = 'false'
         self._version_info = None
+        self.exists_ttl = exists_ttl
+        self._exists = {}
 
     def __contains__(self, name):
         """Return whether the server contains a database with the specified
@@ -94,11 +100,18 @@ class Server(object):
         :param name: the database name
         :return: `True` if a database with the name exists, `False` otherwise
         """
+        exists = self._cached_exists(name)
+        if exists is not None:
+            return exists
         try:
             self.resource.head(name)
-            return True
-        except (socket.error, http.ResourceNotFound):
+        except http.ResourceNotFound:
+            self._remember_exists(name, False)
+            return False
+        except socket.error:
             return False
+        self._remember_exists(name, True)
+        return True
 
     def __iter__(self):
         """Iterate over the names of all databases."""
@@ -130,7 +143,9 @@ class Server(object):
         :param name: the name of the database
         :raise ResourceNotFound: if no database with that name exists
         """
+        self._exists.pop(name, None)
         self.resource.delete_json(name)
+        self._remember_exists(name, False)
 
     def __getitem__(self, name):
         """Return a `Database` object representing the database with the
@@ -141,10 +156,35 @@ class Server(object):
         :rtype: `Database`
         :raise ResourceNotFound: if no database with that name exists
         """
-        db = Database(self.resource(name), name)
-        db.resource.head() # actually make a request to the database
+        db = self._database(name)
+        if not self._cached_exists(name):
+            try:
+                db.resource.head() # actually make a request to the database
+            except http.ResourceNotFound:
+                self._remember_exists(name, False)
+                raise
+            self._remember_exists(name, True)
         return db
 
+    def _database(self, name):
+        # Return a `Database` object without checking that it exists, for
+        # callers that are about to make a request to it anyway.
+        return Database(self.resource(name), name)
+
+    def _cached_exists(self, name):
+        # Return whether the database was found the last time it was checked,
+        # or `None` if that is unknown or longer than `exists_ttl` ago.
+        if name in self._exists:
+            exists, expires = self._exists[name]
+            if time.time() < expires:
+                return exists
+            self._exists.pop(name, None)
+        return None
+
+    def _remember_exists(self, name, exists):
+        if self.exists_ttl:
+            self._exists[name] = exists, time.time() + self.exists_ttl
+
     def config(self):
         """The configuration of the CouchDB server.
 
@@ -219,7 +259,8 @@ class Server(object):
         :raise PreconditionFailed: if a database with that name already exists
         """
         self.resource.put_json(name)
-        return self[name]
+        self._remember_exists(name, True)
+        return self._database(name)
 
     def delete(self, name):
         """Delete the database with the specified name.
@@ -251,9 +292,9 @@ class Server(object):
         :return: (id, rev) tuple of the registered user
         :rtype: `tuple`
         """
-        user_db = self['_users']
+        user_db = self._database('_users')
         return user_db.save({
-            '_id': 'org.couchdb.user:' + name,
+            '_id': USER_PREFIX + name,
             'name': name,
             'password': password,
             'roles': roles or [],
@@ -265,9 +306,8 @@ class Server(object):
 
         :param name: name of regular user, normally user id
         """
-        user_db = self['_users']
-        doc_id = 'org.couchdb.user:' + name
-        del user_db[doc_id]
+        user_db = self._database('_users')
+        del user_db[USER_PREFIX + name]
 
     def login(self, name, password):
         """Login regular user in couch db
@@ -391,14 +431,15 @@ class Database(object):
         :return: `True` if a document with the ID exists, `False` otherwise
         """
         try:
-            _doc_resource(self.resource, id).head()
+            self.resource.head(_doc_path(id))
             return True
         except http.ResourceNotFound:
             return False
 
     def __iter__(self):
         """Return the IDs of all documents in the database."""
-        return iter([item.id for item in self.view('_all_docs')])
+        _, _, data = self.resource.get_json('_all_docs')
+        return (row['id'] for row in data['rows'])
 
     def __len__(self):
         """Return the number of documents in the database."""
@@ -421,9 +462,9 @@ class Database(object):
 
         :param id: the document ID
         """
-        resource = _doc_resource(self.resource, id)
-        status, headers, data = resource.head()
-        resource.delete_json(rev=headers['etag'].strip('"'))
+        path = _doc_path(id)
+        status, headers, data = self.resource.head(path)
+        self.resource.delete_json(path, rev=headers['etag'].strip('"'))
 
     def __getitem__(self, id):
         """Return the document with the specified ID.
@@ -432,7 +473,7 @@ class Database(object):
         :return: a `Row` object representing the requested document
         :rtype: `Document`
         """
-        _, _, data = _doc_resource(self.resource, id).get_json()
+        _, _, data = self.resource.get_json(_doc_path(id))
         return Document(data)
 
     def __setitem__(self, id, content):
@@ -443,8 +484,8 @@ class Database(object):
                         new documents, or a `Row` object for existing
                         documents
         """
-        resource = _doc_resource(self.resource, id)
-        status, headers, data = resource.put_json(body=content)
+        status, headers, data = self.resource.put_json(_doc_path(id),
+                                                       body=content)
         content.update({'_id': data['id'], '_rev': data['rev']})
 
     @property
@@ -523,10 +564,10 @@ class Database(object):
         :rtype: `tuple`
         """
         if '_id' in doc:
-            func = _doc_resource(self.resource, doc['_id']).put_json
+            _, _, data = self.resource.put_json(_doc_path(doc['_id']),
+                                                body=doc, **options)
         else:
-            func = self.resource.post_json
-        _, _, data = func(body=doc, **options)
+            _, _, data = self.resource.post_json(body=doc, **options)
         id, rev = data['id'], data.get('rev')
         doc['_id'] = id
         if rev is not None: # Not present for batch='ok'
@@ -588,21 +629,10 @@ class Database(object):
         :since: 0.6
         """
         if not isinstance(src, util.strbase):
-            if not isinstance(src, dict):
-                if hasattr(src, 'items'):
-                    src = dict(src.items())
-                else:
-                    raise TypeError('expected dict or string, got %s' %
-                                    type(src))
-            src = src['_id']
+            src = _doc_dict(src, 'dict or string')['_id']
 
         if not isinstance(dest, util.strbase):
-            if not isinstance(dest, dict):
-                if hasattr(dest, 'items'):
-                    dest = dict(dest.items())
-                else:
-                    raise TypeError('expected dict or string, got %s' %
-                                    type(dest))
+            dest = _doc_dict(dest, 'dict or string')
             if '_rev' in dest:
                 dest = '%s?%s' % (http.quote(dest['_id']),
                                   http.urlencode({'rev': dest['_rev']}))
@@ -643,7 +673,7 @@ class Database(object):
         """
         if doc['_id'] is None:
             raise ValueError('document ID cannot be None')
-        _doc_resource(self.resource, doc['_id']).delete_json(rev=doc['_rev'])
+        self.resource.delete_json(_doc_path(doc['_id']), rev=doc['_rev'])
 
     def get(self, id, default=None, **options):
         """Return the document with the specified ID.
@@ -656,7 +686,7 @@ class Database(object):
         :rtype: `Document`
         """
         try:
-            _, _, data = _doc_resource(self.resource, id).get_json(**options)
+            _, _, data = self.resource.get_json(_doc_path(id), **options)
         except http.ResourceNotFound:
             return default
         if hasattr(data, 'items'):
@@ -672,18 +702,30 @@ class Database(object):
                  in reverse chronological order, if any were found
         """
         try:
-            resource = _doc_resource(self.resource, id)
-            status, headers, data = resource.get_json(revs=True)
+            path = _doc_path(id)
+            status, headers, data = self.resource.get_json(path, revs=True)
         except http.ResourceNotFound:
             return
 
         startrev = data['_revisions']['start']
-        for index, rev in enumerate(data['_revisions']['ids']):
-            options['rev'] = '%d-%s' % (startrev - index, rev)
-            revision = self.get(id, **options)
-            if revision is None:
-                return
-            yield revision
+        revs = ['%d-%s' % (startrev - index, rev)
+                for index, rev in enumerate(data['_revisions']['ids'])]
+
+        # Fetch the revisions in batches using ``open_revs``, instead of
+        # making a separate request for every single revision.
+        options.pop('rev', None)
+        for start in range(0, len(revs), OPEN_REVS_BATCH):
+            batch = revs[start:start + OPEN_REVS_BATCH]
+            options['open_revs'] = json.encode(batch)
+            _, _, results = self.resource.get_json(path, **options)
+            found = {}
+            for result in results:
+                if 'ok' in result:
+                    found[result['ok']['_rev']] = result['ok']
+            for rev in batch:
+                if rev not in found:
+                    return
+                yield Document(found[rev])
 
     def info(self, ddoc=None):
         """Return information about the database or design document as a
@@ -718,21 +760,28 @@ class Database(object):
         :param filename: the name of the attachment file
         :since: 0.4.1
         """
-        resource = _doc_resource(self.resource, doc['_id'])
-        _, _, data = resource.delete_json(filename, rev=doc['_rev'])
+        path = _doc_path(doc['_id']) + [filename]
+        _, _, data = self.resource.delete_json(path, rev=doc['_rev'])
         doc['_rev'] = data['rev']
 
-    def get_attachment(self, id_or_doc, filename, default=None):
+    def get_attachment(self, id_or_doc, filename, default=None, dest=None):
         """Return an attachment from the specified doc id and filename.
 
+        Large attachments are streamed from the server as they are read. To
+        write an attachment to a file without holding it in memory, pass the
+        file as the `dest` argument.
+
         :param id_or_doc: either a document ID or a dictionary or `Document`
                           object representing the document that the attachment
                           belongs to
         :param filename: the name of the attachment file
         :param default: default value to return when the document or attachment
                         is not found
-        :return: a file-like object with read and close methods, or the value
-                 of the `default` argument if the attachment is not found
+        :param dest: an optional writable file-like object that the attachment
+                     content should be copied to
+        :return: a file-like object with read and close methods (`dest`, if
+                 given), or the value of the `default` argument if the
+                 attachment is not found
         :since: 0.4.1
         """
         if isinstance(id_or_doc, util.strbase):
@@ -740,10 +789,17 @@ class Database(object):
         else:
             id = id_or_doc['_id']
         try:
-            _, _, data = _doc_resource(self.resource, id).get(filename)
-            return data
+            _, _, data = self.resource.get(_doc_path(id) + [filename])
         except http.ResourceNotFound:
             return default
+        if dest is None:
+            return data
+        while data is not None:
+            chunk = data.read(http.CHUNK_SIZE)
+            if not chunk:
+                break
+            dest.write(chunk)
+        return dest
 
     def put_attachment(self, doc, content, filename=None, content_type=None):
         """Create or replace an attachment.
@@ -770,12 +826,10 @@ class Database(object):
             else:
                 raise ValueError('no filename specified for attachment')
         if content_type is None:
-            content_type = ';'.join(
-                filter(None, mimetypes.guess_type(filename))
-            )
+            content_type = _guess_content_type(filename)
 
-        resource = _doc_resource(self.resource, doc['_id'])
-        status, headers, data = resource.put_json(filename, body=content, headers={
+        path = _doc_path(doc['_id']) + [filename]
+        status, headers, data = self.resource.put_json(path, body=content, headers={
             'Content-Type': content_type
         }, rev=doc['_rev'])
         doc['_rev'] = data['rev']
@@ -811,6 +865,55 @@ class Database(object):
         status, headers, data = self.resource.post_json('_find', mango_query)
         return map(wrapper or Document, data.get('docs', []))
 
+    def iterfind(self, mango_query, batch, wrapper=None):
+        """Iterate the results of a mango find-query, fetching documents in
+        batches and yielding one document at a time.
+
+        Batches are chained using the bookmark returned by CouchDB, so only
+        one batch of documents is held in memory at a time.
+
+        Note: only available for CouchDB version >= 2.0.0
+
+        :param mango_query: a dictionary describing criteria used to select
+                            documents
+        :param batch: number of documents to fetch per HTTP request.
+        :param wrapper: an optional callable that should be used to wrap the
+                        resulting documents
+        :return: document generator
+        """
+        # Check sane batch size.
+        if batch <= 0:
+            raise ValueError('batch must be 1 or more')
+        query = dict(mango_query)
+        # Save caller's limit, it must be handled manually.
+        limit = query.get('limit')
+        if limit is not None and limit <= 0:
+            raise ValueError('limit must be 1 or more')
+        wrapper = wrapper or Document
+        while True:
+
+            loop_limit = min(limit or batch, batch)
+            query['limit'] = loop_limit
+            _, _, data = self.resource.post_json('_find', query)
+            docs = data.get('docs', [])
+
+            # Yield documents from this batch.
+            for doc in docs:
+                yield wrapper(doc)
+
+            # Decrement limit counter.
+            if limit is not None:
+                limit -= len(docs)
+
+            # Check if there is nothing else to yield.
+            bookmark = data.get('bookmark')
+            if len(docs) < loop_limit or limit == 0 or not bookmark:
+                break
+
+            # The bookmark already accounts for any skipped documents.
+            query.pop('skip', None)
+            query['bookmark'] = bookmark
+
     def explain(self, mango_query):
         """Explain a mango find-query.
 
@@ -893,9 +996,9 @@ class Database(object):
                              reduce_fun, language=language,
                              wrapper=wrapper)(**options)
 
-    def update(self, documents, **options):
+    def update(self, documents, batch_size=None, **options):
         """Perform a bulk update or insertion of the given documents using a
-        single HTTP request.
+        single HTTP request, or one request per `batch_size` documents.
 
         >>> server = Server()
         >>> db = server.create('python-tests')
@@ -923,44 +1026,67 @@ class Database(object):
         to a dictionary. Effectively this means you can also use this method
         with `mapping.Document` objects.
 
+        Any extra `options` are sent in the request body, e.g.
+        ``new_edits=False`` to store documents with their existing revisions
+        (as done when replicating), or ``all_or_nothing=True``. CouchDB does
+        not support ``batch='ok'`` on bulk requests; use `save()` with that
+        option for deferred writes of single documents.
+
         :param documents: a sequence of dictionaries or `Document` objects, or
                           objects providing a ``items()`` method that can be
                           used to convert them to a dictionary
+        :param batch_size: the maximum number of documents to send per
+                           request, or `None` to send them all at once (the
+                           default); note that options like
+                           ``all_or_nothing`` then only apply per batch
         :return: an iterable over the resulting documents
         :rtype: ``list``
 
         :since: version 0.2
         """
-        docs = []
-        for doc in documents:
-            if isinstance(doc, dict):
-                docs.append(doc)
-            elif hasattr(doc, 'items'):
-                docs.append(dict(doc.items()))
-            else:
-                raise TypeError('expected dict, got %s' % type(doc))
-
-        content = options
-        content.update(docs=docs)
-        _, _, data = self.resource.post_json('_bulk_docs', body=content)
+        return list(self.iterupdate(documents, batch_size, **options))
+
+    def iterupdate(self, documents, batch_size=None, **options):
+        """Perform a bulk update or insertion of the given documents like
+        `update()`, but yield the result tuples one batch at a time.
+
+        `documents` can be any iterable, including a generator. It is
+        consumed `batch_size` documents at a time, so together with a
+        generator only one batch is held in memory.
+
+        :param documents: an iterable of dictionaries or `Document` objects,
+                          or objects providing a ``items()`` method that can
+                          be used to convert them to a dictionary
+        :param batch_size: the maximum number of documents to send per
+                           request, or `None` to send them all at once (the
+                           default)
+        :return: a generator of ``(success, docid, rev_or_exc)`` tuples
+        """
+        if batch_size is not None and batch_size <= 0:
+            raise ValueError('batch_size must be 1 or more')
+        documents = iter(documents)
+        while True:
+            docs = [_doc_dict(doc)
+                    for doc in itertools.islice(documents, batch_size)]
+            if not docs:
+                break
 
-        results = []
-        for idx, result in enumerate(data):
-            if 'error' in result:
-                if result['error'] == 'conflict':
-                    exc_type = http.ResourceConflict
+            content = dict(options, docs=docs)
+            _, _, data = self.resource.post_json('_bulk_docs', body=content)
+
+            # Results come back in the same order as the documents, and
+            # updating the copy made for non-dict documents is harmless.
+            for doc, result in zip(docs, data):
+                if 'error' in result:
+                    if result['error'] == 'conflict':
+                        exc_type = http.ResourceConflict
+                    else:
+                        # XXX: Any other error types mappable to exceptions here?
+                        exc_type = http.ServerError
+                    yield (False, result['id'], exc_type(result['reason']))
                 else:
-                    # XXX: Any other error types mappable to exceptions here?
-                    exc_type = http.ServerError
-                results.append((False, result['id'],
-                                exc_type(result['reason'])))
-            else:
-                doc = documents[idx]
-                if isinstance(doc, dict): # XXX: Is this a good idea??
                     doc.update({'_id': result['id'], '_rev': result['rev']})
-                results.append((True, result['id'], result['rev']))
-
-        return results
+                    yield (True, result['id'], result['rev'])
 
     def purge(self, docs):
         """Perform purging (complete removing) of the given documents.
@@ -971,13 +1097,8 @@ class Database(object):
         """
         content = {}
         for doc in docs:
-            if isinstance(doc, dict):
-                content[doc['_id']] = [doc['_rev']]
-            elif hasattr(doc, 'items'):
-                doc = dict(doc.items())
-                content[doc['_id']] = [doc['_rev']]
-            else:
-                raise TypeError('expected dict, got %s' % type(doc))
+            doc = _doc_dict(doc)
+            content[doc['_id']] = [doc['_rev']]
         _, _, data = self.resource.post_json('_purge', body=content)
         return data
 
@@ -1008,6 +1129,38 @@ class Database(object):
         return PermanentView(self.resource(*path), '/'.join(path),
                              wrapper=wrapper)(**options)
 
+    def views(self, queries, threads=8):
+        """Execute several predefined views concurrently.
+
+        Each query is a dictionary of keyword arguments for `view()`, so it
+        has at least a ``name`` item. The views are fetched by a pool of
+        threads sharing this database's session; when the session was created
+        with a ``pool_size``, it should be at least `threads` so that
+        connections are reused.
+
+        :param queries: a sequence of dictionaries with the arguments for
+                        `view()`
+        :param threads: the maximum number of views fetched at the same time
+        :return: the fetched view results, in the same order as `queries`
+        :rtype: ``list`` of `ViewResults`
+        """
+        from multiprocessing.pool import ThreadPool
+
+        def fetch(query):
+            results = self.view(**query)
+            results.rows # fetch the rows in this thread
+            return results
+
+        queries = list(queries)
+        if not queries:
+            return []
+        pool = ThreadPool(min(threads, len(queries)))
+        try:
+            return pool.map(fetch, queries)
+        finally:
+            pool.close()
+            pool.join()
+
     def iterview(self, name, batch, wrapper=None, **options):
         """Iterate the rows in a view, fetching rows in batches and yielding
         one row at a time.
@@ -1038,23 +1191,29 @@ class Database(object):
             loop_limit = min(limit or batch, batch)
             # Get rows in batches, with one extra for start of next batch.
             options['limit'] = loop_limit + 1
-            rows = list(self.view(name, wrapper, **options))
-
-            # Yield rows from this batch.
-            for row in itertools.islice(rows, loop_limit):
-                yield row
+            rows = self.view(name, wrapper, **options).rows
+            num_rows = len(rows)
+            if num_rows > loop_limit:
+                next_row = rows.pop()
+
+            # Yield rows from this batch, dropping each one from the batch as
+            # it is yielded so that consumed rows (and their documents) can
+            # be freed before the batch is done.
+            rows.reverse()
+            while rows:
+                yield rows.pop()
 
             # Decrement limit counter.
             if limit is not None:
-                limit -= min(len(rows), batch)
+                limit -= min(num_rows, loop_limit)
 
             # Check if there is nothing else to yield.
-            if len(rows) <= batch or (limit is not None and limit == 0):
+            if num_rows <= loop_limit or limit == 0:
                 break
 
             # Update options with start keys for next loop.
-            options.update(startkey=rows[-1]['key'],
-                           startkey_docid=rows[-1]['id'], skip=0)
+            options.update(startkey=next_row['key'],
+                           startkey_docid=next_row['id'], skip=0)
 
     def show(self, name, docid=None, **options):
         """Call a 'show' function.
@@ -1146,14 +1305,51 @@ class Database(object):
         return data
 
 
-def _doc_resource(base, doc_id):
-    """Return the resource for the given document id.
+def _doc_path(doc_id):
+    """Return the path segments for the given document id, relative to the
+    database resource.
     """
     # Split an id that starts with a reserved segment, e.g. _design/foo, so
     # that the / that follows the 1st segment does not get escaped.
     if doc_id[:1] == '_':
-        return base(*doc_id.split('/', 1))
-    return base(doc_id)
+        return doc_id.split('/', 1)
+    return [doc_id]
+
+
+def _doc_dict(doc, expected='dict'):
+    """Return the given document as a dictionary, converting objects that
+    provide an ``items()`` method (such as `mapping.Document` instances).
+    """
+    if isinstance(doc, dict):
+        return doc
+    elif hasattr(doc, 'items'):
+        return dict(doc.items())
+    raise TypeError('expected %s, got %s' % (expected, type(doc)))
+
+
+CONTENT_TYPE_CACHE_SIZE = 256
+_content_types = {}
+
+def _guess_content_type(filename):
+    """Guess the content type of an attachment from its filename.
+
+    The guess only depends on the extensions of the filename, so results are
+    memoized per extension.
+    """
+    basename = filename[filename.rfind('/') + 1:]
+    dot = basename.find('.')
+    if dot < 0:
+        key = filename
+    else:
+        key = basename[dot:]
+    content_type = _content_types.get(key)
+    if content_type is None:
+        import mimetypes
+        content_type = ';'.join(filter(None, mimetypes.guess_type(filename)))
+        if len(_content_types) >= CONTENT_TYPE_CACHE_SIZE:
+            _content_types.clear()
+        _content_types[key] = content_type
+    return content_type
 
 
 def _path_from_name(name, type):
@@ -1175,8 +1371,8 @@ class Document(dict):
 
     def __repr__(self):
         return '<%s %r@%r %r>' % (type(self).__name__, self.id, self.rev,
-                                  dict([(k,v) for k,v in self.items()
-                                        if k not in ('_id', '_rev')]))
+                                  {k: v for k, v in self.items()
+                                   if k not in ('_id', '_rev')})
 
     @property
     def id(self):
@@ -1237,6 +1433,10 @@ class TemporaryView(View):
     def __init__(self, uri, map_fun, reduce_fun=None,
                  language='javascript', wrapper=None, session=None):
         View.__init__(self, uri, wrapper=wrapper, session=session)
+        # Imported here as they are only needed for temporary views and are
+        # comparatively slow to import.
+        from inspect import getsource
+        from textwrap import dedent
         if isinstance(map_fun, FunctionType):
             map_fun = getsource(map_fun).rstrip('\n\r')
         self.map_fun = dedent(map_fun.lstrip('\n\r'))
@@ -1256,23 +1456,37 @@ class TemporaryView(View):
         if self.reduce_fun:
             body['reduce'] = self.reduce_fun
         if 'keys' in options:
-            options = options.copy()
-            body['keys'] = options.pop('keys')
-        content = json.encode(body).encode('utf-8')
+            body['keys'] = options['keys']
+        content = json.encode_bytes(body)
         _, _, data = self.resource.post_json(body=content, headers={
             'Content-Type': 'application/json'
         }, **_encode_view_options(options))
         return data
 
 
+# View options whose values are always sent as JSON, even when they are
+# strings. CouchDB 2.0 accepts the underscored spellings as aliases.
+JSON_VIEW_OPTIONS = frozenset(['key', 'startkey', 'endkey',
+                               'start_key', 'end_key'])
+
 def _encode_view_options(options):
     """Encode any items in the options dict that are sent as a JSON string to a
     view/list function.
+
+    The ``keys`` option is left out, as it is sent in the request body.
     """
     retval = {}
     for name, value in options.items():
-        if name in ('key', 'startkey', 'endkey') \
-                or not isinstance(value, util.strbase):
+        if name == 'keys':
+            continue
+        elif value is True:
+            value = 'true'
+        elif value is False:
+            value = 'false'
+        elif type(value) is int:
+            # Plain integers (limit, skip, ...) encode the same as JSON.
+            value = str(value)
+        elif name in JSON_VIEW_OPTIONS or not isinstance(value, util.strbase):
             value = json.encode(value)
         retval[name] = value
     return retval
@@ -1282,8 +1496,7 @@ def _call_viewlike(resource, options):
     """Call a resource that takes view-like options.
     """
     if 'keys' in options:
-        options = options.copy()
-        keys = {'keys': options.pop('keys')}
+        keys = {'keys': options['keys']}
         return resource.post_json(body=keys, **_encode_view_options(options))
     else:
         return resource.get_json(**_encode_view_options(options))
@@ -1363,7 +1576,12 @@ class ViewResults(object):
     def _fetch(self):
         data = self.view._exec(self.options)
         wrapper = self.view.wrapper or Row
-        self._rows = [wrapper(row) for row in data['rows']]
+        # Wrap the rows in place, so each decoded row can be freed as soon as
+        # it has been wrapped instead of keeping two copies of the results.
+        rows = data['rows']
+        for idx, row in enumerate(rows):
+            rows[idx] = wrapper(row)
+        self._rows = rows
         self._total_rows = data.get('total_rows')
         self._offset = data.get('offset', 0)
         self._update_seq = data.get('update_seq')
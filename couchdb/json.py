@@ -12,6 +12,7 @@ and encoding JSON data.
 This module currently supports the following JSON modules:
  - ``simplejson``: https://github.com/simplejson/simplejson
  - ``cjson``: http://pypi.python.org/pypi/python-cjson
+ - ``orjson``: https://github.com/ijl/orjson
  - ``json``: This is the version of ``simplejson`` that is bundled with the
    Python standard library since version 2.6
    (see http://docs.python.org/library/json.html)
@@ -23,6 +24,9 @@ which module to use, invoke the `use()` function with the module name::
     from couchdb import json
     json.use('cjson')
 
+Note that ``orjson`` is never picked by default, as it serializes ``NaN``
+and ``Infinity`` as ``null`` instead of rejecting them.
+
 In addition to choosing one of the above modules, you can also configure
 CouchDB-Python to use custom decoding and encoding functions::
 
@@ -31,7 +35,7 @@ CouchDB-Python to use custom decoding and encoding functions::
 
 """
 
-__all__ = ['decode', 'encode', 'use']
+__all__ = ['decode', 'encode', 'encode_bytes', 'use']
 
 from couchdb import util
 import warnings
@@ -41,6 +45,7 @@ _initialized = False
 _using = os.environ.get('COUCHDB_PYTHON_JSON')
 _decode = None
 _encode = None
+_encode_bytes = None
 
 
 def decode(string):
@@ -69,12 +74,30 @@ def encode(obj):
     return _encode(obj)
 
 
+def encode_bytes(obj):
+    """Encode the given object as a UTF-8 encoded JSON byte string, ready to
+    be sent as a request body.
+
+    :param obj: the Python data structure to encode
+    :type obj: object
+    :return: the corresponding UTF-8 encoded JSON string
+    :rtype: bytes
+    """
+    if not _initialized:
+        _initialize()
+    return _encode_bytes(obj)
+
+
+def _encode_utf8(obj):
+    return _encode(obj).encode('utf-8')
+
+
 def use(module=None, decode=None, encode=None):
     """Set the JSON library that should be used, either by specifying a known
     module name, or by providing a decode and encode function.
     
-    The modules "simplejson" and "json" are currently supported for the
-    ``module`` parameter.
+    The modules "simplejson", "orjson" and "json" are currently supported for
+    the ``module`` parameter.
     
     If provided, the ``decode`` parameter must be a callable that accepts a
     JSON string and returns a corresponding Python data structure. The
@@ -90,11 +113,11 @@ def use(module=None, decode=None, encode=None):
     :param encode: a function for encoding objects as JSON strings
     :type encode: callable
     """
-    global _decode, _encode, _initialized, _using
+    global _decode, _encode, _encode_bytes, _initialized, _using
     if module is not None:
         if not isinstance(module, util.strbase):
             module = module.__name__
-        if module not in ('cjson', 'json', 'simplejson'):
+        if module not in ('cjson', 'json', 'orjson', 'simplejson'):
             raise ValueError('Unsupported JSON module %s' % module)
         _using = module
         _initialized = False
@@ -103,11 +126,13 @@ def use(module=None, decode=None, encode=None):
         _using = 'custom'
         _decode = decode
         _encode = encode
+        _encode_bytes = _encode_utf8
         _initialized = True
 
 
 def _initialize():
-    global _initialized
+    global _initialized, _encode_bytes
+    _encode_bytes = _encode_utf8
 
     def _init_simplejson():
         global _decode, _encode
@@ -122,6 +147,14 @@ def _initialize():
         _decode = lambda string, decode=cjson.decode: decode(string)
         _encode = lambda obj, encode=cjson.encode: encode(obj)
 
+    def _init_orjson():
+        global _decode, _encode, _encode_bytes
+        import orjson
+        _decode = lambda string, loads=orjson.loads: loads(string)
+        _encode = lambda obj, dumps=orjson.dumps: dumps(obj).decode('utf-8')
+        # orjson already produces UTF-8 bytes, skip the round trip via str.
+        _encode_bytes = orjson.dumps
+
     def _init_stdlib():
         global _decode, _encode
         json = __import__('json', {}, {})
@@ -142,6 +175,8 @@ def _initialize():
                       "[2011-11-09].",
                       DeprecationWarning, stacklevel=1)
         _init_cjson()
+    elif _using == 'orjson':
+        _init_orjson()
     elif _using == 'json':
         _init_stdlib()
     elif _using != 'custom':
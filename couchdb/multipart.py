@@ -26,6 +26,11 @@ __docformat__ = 'restructuredtext en'
 
 
 CRLF = b'\r\n'
+CHUNK_SIZE = 64 * 1024
+# Parts mostly share a few content types, so their header lines are
+# memoized rather than encoded again for every part.
+HEADER_CACHE_SIZE = 256
+_content_type_lines = {}
 
 
 def read_multipart(fileobj, boundary=None):
@@ -61,11 +66,16 @@ def read_multipart(fileobj, boundary=None):
             payload = payload[:-2]
         elif payload.endswith(b'\n'):
             payload = payload[:-1]
-        content_md5 = headers.get(b'content-md5')
+        content_md5 = headers.get('content-md5')
         if content_md5:
-            h = b64encode(md5(payload).digest())
+            h = b64encode(md5(payload).digest()).decode('ascii')
             if content_md5 != h:
                 raise ValueError('data integrity check failed')
+        # Parts streamed without a Content-MD5 still state their length, which
+        # catches parts cut short, such as at the end of an interrupted dump.
+        content_length = headers.get('content-length')
+        if content_length is not None and int(content_length) != len(payload):
+            raise ValueError('data integrity check failed')
         return headers, False, payload
 
     for line in fileobj:
@@ -124,6 +134,8 @@ class MultipartWriter(object):
         if boundary is None:
             boundary = '==' + uuid.uuid4().hex + '=='
         self.boundary = boundary
+        self._delimiter = b'--' + boundary.encode('utf-8') + CRLF
+        self._close_delimiter = b'--' + boundary.encode('utf-8') + b'--' + CRLF
         if headers is None:
             headers = {}
         headers['Content-Type'] = 'multipart/%s; boundary="%s"' % (
@@ -132,21 +144,16 @@ class MultipartWriter(object):
         self._write_headers(headers)
 
     def open(self, headers=None, subtype='mixed', boundary=None):
-        self.fileobj.write(b'--')
-        self.fileobj.write(self.boundary.encode('utf-8'))
-        self.fileobj.write(CRLF)
+        self.fileobj.write(self._delimiter)
         return MultipartWriter(self.fileobj, headers=headers, subtype=subtype,
                                boundary=boundary)
 
     def add(self, mimetype, content, headers=None):
-        self.fileobj.write(b'--')
-        self.fileobj.write(self.boundary.encode('utf-8'))
-        self.fileobj.write(CRLF)
         if headers is None:
             headers = {}
 
-        ctype, params = parse_header(mimetype)
         if isinstance(content, util.utype):
+            ctype, params = parse_header(mimetype)
             if 'charset' in params:
                 content = content.encode(params['charset'])
             else:
@@ -158,29 +165,61 @@ class MultipartWriter(object):
             headers['Content-Length'] = str(len(content))
             hash = b64encode(md5(content).digest()).decode('ascii')
             headers['Content-MD5'] = hash
-        self._write_headers(headers)
+        self._write_headers(headers, self._delimiter, memoize=True)
         if content:
             # XXX: throw an exception if a boundary appears in the content??
             self.fileobj.write(content)
             self.fileobj.write(CRLF)
 
+    def add_stream(self, mimetype, stream, headers=None, length=None,
+                   chunk_size=CHUNK_SIZE):
+        """Add a part with the content read from the file-like object
+        `stream`, which is copied in chunks of `chunk_size` bytes instead of
+        being held in memory.
+
+        As the content is not known up front, no ``Content-MD5`` header is
+        written, and a ``Content-Length`` header only if `length` is given.
+        """
+        if headers is None:
+            headers = {}
+
+        headers['Content-Type'] = mimetype
+        if length is not None:
+            headers['Content-Length'] = str(length)
+        self._write_headers(headers, self._delimiter, memoize=True)
+        written = False
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            self.fileobj.write(chunk)
+            written = True
+        if written:
+            self.fileobj.write(CRLF)
+
     def close(self):
-        self.fileobj.write(b'--')
-        self.fileobj.write(self.boundary.encode('ascii'))
-        self.fileobj.write(b'--')
-        self.fileobj.write(CRLF)
+        self.fileobj.write(self._close_delimiter)
 
-    def _write_headers(self, headers):
+    def _write_headers(self, headers, prefix=b'', memoize=False):
+        # Collect the header block so that it is written in a single call.
+        # Content types of parts are memoized, but not the one of a nested
+        # envelope, which is unique to it through its boundary.
+        lines = [prefix]
         if headers:
             for name in sorted(headers.keys()):
                 value = headers[name]
-                if value.encode('ascii', 'ignore') != value.encode('utf-8'):
-                    value = header.make_header([(value, 'utf-8')]).encode()
-                self.fileobj.write(name.encode('utf-8'))
-                self.fileobj.write(b': ')
-                self.fileobj.write(value.encode('utf-8'))
-                self.fileobj.write(CRLF)
-        self.fileobj.write(CRLF)
+                if memoize and name == 'Content-Type':
+                    line = _content_type_lines.get(value)
+                    if line is None:
+                        line = _header_line(name, value)
+                        if len(_content_type_lines) >= HEADER_CACHE_SIZE:
+                            _content_type_lines.clear()
+                        _content_type_lines[value] = line
+                else:
+                    line = _header_line(name, value)
+                lines.append(line)
+        lines.append(CRLF)
+        self.fileobj.write(b''.join(lines))
 
     def __enter__(self):
         return self
@@ -189,6 +228,15 @@ class MultipartWriter(object):
         self.close()
 
 
+def _header_line(name, value):
+    try:
+        encoded = value.encode('ascii')
+    except UnicodeError:
+        encoded = header.make_header([(value, 'utf-8')]).encode()
+        encoded = encoded.encode('utf-8')
+    return name.encode('utf-8') + b': ' + encoded + CRLF
+
+
 def write_multipart(fileobj, subtype='mixed', boundary=None):
     r"""Simple streaming MIME multipart writer.
 
@@ -15,8 +15,9 @@ import tempfile
 import threading
 import unittest
 
-from couchdb import client, http, util
+from couchdb import client, http, json, util
 from couchdb.tests import testutil
+from couchdb.tests.couchhttp import FakeResponse, fake_session
 
 
 class ServerTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
@@ -151,6 +152,189 @@ class ServerTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
             server.remove_user('foo')
 
 
+class ServerExistsTTLTestCase(unittest.TestCase):
+
+    def test_contains_remembered(self):
+        session, conn = fake_session(FakeResponse(200, {}))
+        server = client.Server('http://localhost:5984/', session=session,
+                               exists_ttl=60)
+        self.assertTrue('foo' in server)
+        self.assertTrue('foo' in server)
+        server['foo']
+        self.assertEqual(len(conn.requests), 1)
+
+    def test_delete_forgets(self):
+        session, conn = fake_session(FakeResponse(200, {}),
+                                     FakeResponse(200, {}))
+        server = client.Server('http://localhost:5984/', session=session,
+                               exists_ttl=60)
+        self.assertTrue('foo' in server)
+        del server['foo']
+        self.assertFalse('foo' in server)
+        self.assertEqual(len(conn.requests), 2)
+
+    def test_disabled_by_default(self):
+        session, conn = fake_session(FakeResponse(200, {}),
+                                     FakeResponse(404, {}))
+        server = client.Server('http://localhost:5984/', session=session)
+        self.assertTrue('foo' in server)
+        self.assertFalse('foo' in server)
+
+
+def json_response(data):
+    body = json.encode(data).encode('utf-8')
+    return FakeResponse(200, {'Content-Type': 'application/json',
+                              'Content-Length': str(len(body))}, body)
+
+
+class RevisionsTestCase(unittest.TestCase):
+
+    def test_batches(self):
+        revs = ['%d-%d' % (5 - i, i) for i in range(5)]
+        session, conn = fake_session(
+            json_response({'_id': 'foo', '_rev': revs[0], '_revisions': {
+                'start': 5, 'ids': [rev.split('-')[1] for rev in revs]}}),
+            json_response([{'ok': {'_id': 'foo', '_rev': rev}}
+                            for rev in reversed(revs[:3])]),
+            json_response([{'ok': {'_id': 'foo', '_rev': revs[3]}},
+                            {'missing': revs[4]}]))
+        db = client.Database('http://localhost:5984/db', session=session)
+        orig_batch, client.OPEN_REVS_BATCH = client.OPEN_REVS_BATCH, 3
+        try:
+            found = [doc.rev for doc in db.revisions('foo')]
+        finally:
+            client.OPEN_REVS_BATCH = orig_batch
+        self.assertEqual(found, revs[:4])
+        self.assertEqual(len(conn.requests), 3)
+
+
+class IterFindTestCase(unittest.TestCase):
+
+    def test_bookmark_paging(self):
+        session, conn = fake_session(
+            json_response({'docs': [{'_id': 'a'}, {'_id': 'b'}],
+                            'bookmark': 'b1'}),
+            json_response({'docs': [{'_id': 'c'}], 'bookmark': 'b2'}))
+        db = client.Database('http://localhost:5984/db', session=session)
+        docs = list(db.iterfind({'selector': {}, 'skip': 1}, 2))
+        self.assertEqual([doc.id for doc in docs], ['a', 'b', 'c'])
+        queries = [json.decode(body.decode('utf-8')) for body in conn.bodies]
+        self.assertEqual(queries[0], {'selector': {}, 'skip': 1, 'limit': 2})
+        self.assertEqual(queries[1], {'selector': {}, 'limit': 2,
+                                      'bookmark': 'b1'})
+
+    def test_limit(self):
+        session, conn = fake_session(
+            json_response({'docs': [{'_id': 'a'}, {'_id': 'b'}],
+                            'bookmark': 'b1'}),
+            json_response({'docs': [{'_id': 'c'}], 'bookmark': 'b2'}))
+        db = client.Database('http://localhost:5984/db', session=session)
+        docs = list(db.iterfind({'selector': {}, 'limit': 3}, 2))
+        self.assertEqual(len(docs), 3)
+        self.assertEqual(json.decode(conn.bodies[1].decode('utf-8'))['limit'], 1)
+        self.assertRaises(ValueError, lambda: next(db.iterfind({}, 0)))
+
+
+class IterUpdateTestCase(unittest.TestCase):
+
+    def test_generator_in_batches(self):
+        session, conn = fake_session(
+            json_response([{'id': 'a', 'rev': '1-a'}, {'id': 'b', 'rev': '1-b'}]),
+            json_response([{'id': 'c', 'error': 'conflict',
+                            'reason': 'Document update conflict.'}]))
+        db = client.Database('http://localhost:5984/db', session=session)
+        docs = [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}]
+        results = db.iterupdate((doc for doc in docs), batch_size=2)
+        self.assertEqual(next(results), (True, 'a', '1-a'))
+        self.assertEqual(len(conn.bodies), 1)
+        results = list(results)
+        self.assertEqual(len(conn.bodies), 2)
+        self.assertEqual(results[0], (True, 'b', '1-b'))
+        self.assertTrue(isinstance(results[1][2], http.ResourceConflict))
+        self.assertEqual(docs[1]['_rev'], '1-b')
+        self.assertFalse('_rev' in docs[2])
+
+
+class ViewsTestCase(unittest.TestCase):
+
+    def test_views(self):
+        session, conn = fake_session(
+            json_response({'total_rows': 1, 'offset': 0,
+                           'rows': [{'id': 'a', 'key': 1, 'value': None}]}),
+            json_response({'rows': [{'key': None, 'value': 3}]}))
+        db = client.Database('http://localhost:5984/db', session=session)
+        results = db.views([{'name': 'test/nums', 'limit': 1},
+                            {'name': 'test/sum', 'group': False}], threads=1)
+        self.assertEqual([row.id for row in results[0]], ['a'])
+        self.assertEqual(results[1].rows[0].value, 3)
+        self.assertEqual([request[1] for request in conn.requests],
+                         ['/db/_design/test/_view/nums?limit=1',
+                          '/db/_design/test/_view/sum?group=false'])
+        self.assertEqual(db.views([]), [])
+
+
+class IterViewTestCase(unittest.TestCase):
+
+    def _rows(self, *keys):
+        return json_response({'rows': [{'id': 'd%d' % key, 'key': key,
+                                        'value': None} for key in keys]})
+
+    def test_batches(self):
+        session, conn = fake_session(self._rows(1, 2, 3), self._rows(3, 4, 5),
+                                     self._rows(5))
+        db = client.Database('http://localhost:5984/db', session=session)
+        rows = list(db.iterview('test/nums', 2))
+        self.assertEqual([row.key for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(len(conn.requests), 3)
+        path = conn.requests[1][1]
+        self.assertTrue('limit=3' in path)
+        self.assertTrue('startkey=3' in path)
+        self.assertTrue('startkey_docid=d3' in path)
+
+    def test_skip_only_first_batch(self):
+        session, conn = fake_session(self._rows(3, 4, 5), self._rows(5, 6))
+        db = client.Database('http://localhost:5984/db', session=session)
+        rows = list(db.iterview('test/nums', 2, skip=2))
+        self.assertEqual([row.key for row in rows], [3, 4, 5, 6])
+        self.assertTrue('skip=2' in conn.requests[0][1])
+        self.assertTrue('skip=0' in conn.requests[1][1])
+
+    def test_limit(self):
+        session, conn = fake_session(self._rows(1, 2, 3), self._rows(3, 4))
+        db = client.Database('http://localhost:5984/db', session=session)
+        rows = list(db.iterview('test/nums', 2, limit=3))
+        self.assertEqual([row.key for row in rows], [1, 2, 3])
+        self.assertTrue('limit=2' in conn.requests[1][1])
+
+
+class ViewOptionsTestCase(unittest.TestCase):
+
+    def test_encode_view_options(self):
+        options = client._encode_view_options({
+            'key': 'foo', 'start_key': 'a', 'end_key': ['b', {}],
+            'limit': 10, 'descending': True, 'stale': 'ok', 'keys': [1]})
+        self.assertEqual(options, {
+            'key': '"foo"', 'start_key': '"a"', 'end_key': '["b", {}]',
+            'limit': '10', 'descending': 'true', 'stale': 'ok'})
+
+
+class DictSubclassTestCase(unittest.TestCase):
+
+    def test_document_weakref_and_attributes(self):
+        import weakref
+        doc = client.Document(_id='foo', _rev='1-abc')
+        self.assertTrue(weakref.ref(doc)() is doc)
+        doc.note = 'kept'
+        self.assertEqual(doc.note, 'kept')
+
+    def test_row_weakref_and_attributes(self):
+        import weakref
+        row = client.Row(id='foo', key='foo', value=None)
+        self.assertTrue(weakref.ref(row)() is row)
+        row.note = 'kept'
+        self.assertEqual(row.note, 'kept')
+
+
 class DatabaseTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
 
     def test_save_new(self):
@@ -310,6 +494,18 @@ class DatabaseTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
         self.assertNotEqual(old_rev, doc['_rev'])
         self.assertEqual(None, self.db['foo'].get('_attachments'))
 
+    def test_attachment_to_dest(self):
+        doc = {}
+        self.db['foo'] = doc
+        content = b'Foo bar baz' * 1000
+        self.db.put_attachment(doc, content, 'foo.txt')
+        dest = util.StringIO()
+        self.assertTrue(self.db.get_attachment(doc, 'foo.txt', dest=dest)
+                        is dest)
+        self.assertEqual(content, dest.getvalue())
+        self.assertEqual(None, self.db.get_attachment(doc, 'bar.txt',
+                                                      dest=dest))
+
     def test_empty_attachment(self):
         doc = {}
         self.db['foo'] = doc
@@ -494,6 +690,16 @@ class DatabaseTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
         revs = self.db.get(doc['_id'], open_revs='all')
         assert len(revs) == 2
 
+    def test_bulk_update_batches(self):
+        docs = [dict(type='Person', num=i) for i in range(5)]
+        results = self.db.update(docs, batch_size=2)
+        self.assertEqual(len(results), 5)
+        for doc, (success, docid, rev) in zip(docs, results):
+            self.assertTrue(success)
+            self.assertEqual(docid, doc['_id'])
+            self.assertEqual(rev, doc['_rev'])
+        self.assertEqual(len(self.db), 5)
+
     def test_bulk_update_bad_doc(self):
         self.assertRaises(TypeError, self.db.update, [object()])
 
@@ -946,6 +1152,14 @@ class ViewIterationTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(ServerTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(ServerExistsTTLTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(RevisionsTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(IterFindTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(IterUpdateTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(ViewsTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(IterViewTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(ViewOptionsTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(DictSubclassTestCase, 'test'))
     suite.addTest(unittest.makeSuite(DatabaseTestCase, 'test'))
     suite.addTest(unittest.makeSuite(ViewTestCase, 'test'))
     suite.addTest(unittest.makeSuite(ShowListTestCase, 'test'))
@@ -227,6 +227,35 @@ Content-Type: application/json;charset=utf-8
 {"_rev": "3-bc27b6930ca514527d8954c7c43e6a09", "_id": "文档"}
 '''.encode('utf-8'), buf.getvalue().replace(b'\r\n', b'\n'))
 
+    def test_content_type_lines_cached(self):
+        buf = StringIO()
+        envelope = multipart.write_multipart(buf, boundary='==123456789==')
+        envelope.add('text/plain', b'one')
+        envelope.add('text/plain', b'two')
+        envelope.close()
+        self.assertEqual(b'Content-Type: text/plain\r\n',
+                         multipart._content_type_lines['text/plain'])
+        self.assertEqual(2, buf.getvalue().count(
+            b'\r\nContent-Type: text/plain\r\n'))
+
+    def test_envelope_content_type_not_cached(self):
+        buf = StringIO()
+        envelope = multipart.write_multipart(buf, boundary='==123456789==')
+        part = envelope.open(boundary='==abcdefghi==')
+        part.close()
+        envelope.close()
+        self.assertFalse(any('==123456789==' in value or
+                             '==abcdefghi==' in value
+                             for value in multipart._content_type_lines))
+
+    def test_content_type_cache_bounded(self):
+        buf = StringIO()
+        envelope = multipart.write_multipart(buf, boundary='==123456789==')
+        for i in range(multipart.HEADER_CACHE_SIZE + 1):
+            envelope.add('application/x-test-%d' % i, b'data')
+        self.assertTrue(len(multipart._content_type_lines) <=
+                        multipart.HEADER_CACHE_SIZE)
+
 
 def suite():
     suite = unittest.TestSuite()
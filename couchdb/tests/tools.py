@@ -8,10 +8,23 @@
 #
 
 
+from base64 import b64encode
+from hashlib import md5
+import os
+import shutil
+import tempfile
+import sys
 import unittest
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 from couchdb.util import StringIO
-from couchdb import Unauthorized
+from couchdb import Unauthorized, json
+from couchdb.client import Document
+from couchdb.multipart import read_multipart, write_multipart
 from couchdb.tools import load, dump
 from couchdb.tests import testutil
 
@@ -36,9 +49,286 @@ class ToolDumpTestCase(testutil.TempDatabaseMixin, unittest.TestCase):
             pass
 
 
+class DumpDocsTestCase(unittest.TestCase):
+
+    def _dump(self, docs, db=None):
+        output = StringIO()
+        envelope = write_multipart(output, boundary='==dump==')
+        dump.dump_docs(envelope, db, docs)
+        envelope.close()
+        output.seek(0)
+        # The parser reuses its header dicts, so copy them while iterating.
+        parts = []
+        for headers, is_multipart, payload in read_multipart(output):
+            if is_multipart:
+                payload = [(dict(h), p) for h, _, p in payload]
+            parts.append((dict(headers), is_multipart, payload))
+        return parts
+
+    def test_docs_and_inline_attachments(self):
+        data = b64encode(b'Hello, world!').decode('ascii')
+        parts = self._dump([
+            Document(_id='foo', _rev='1-abc', n=1),
+            Document(_id='bar', _rev='2-def', _attachments={
+                'hello.txt': {'content_type': 'text/plain', 'data': data}}),
+        ])
+        headers, is_multipart, payload = parts[0]
+        self.assertFalse(is_multipart)
+        self.assertEqual(headers['content-id'], 'foo')
+        self.assertEqual(headers['etag'], '"1-abc"')
+        self.assertEqual(json.decode(payload.decode('utf-8')),
+                         {'_id': 'foo', '_rev': '1-abc', 'n': 1})
+
+        headers, is_multipart, payload = parts[1]
+        self.assertTrue(is_multipart)
+        self.assertEqual(headers['content-id'], 'bar')
+        self.assertEqual(json.decode(payload[0][1].decode('utf-8')),
+                         {'_id': 'bar', '_rev': '2-def'})
+        self.assertEqual(payload[1][0]['content-id'], 'hello.txt')
+        self.assertEqual(payload[1][0]['content-type'], 'text/plain')
+        self.assertEqual(payload[1][0]['content-transfer-encoding'], 'base64')
+        self.assertEqual(payload[1][1], data.encode('ascii'))
+
+    def test_attachments_fetched_concurrently(self):
+        class FakeDatabase(object):
+            def get_attachment(self, doc_id, name, default=None):
+                return StringIO(name.encode('ascii') * 3)
+        names = ['a%d' % i for i in range(5)]
+        doc = {'_id': 'foo', '_rev': '1-abc', '_attachments': dict(
+            (name, {'content_type': 'text/plain', 'stub': True})
+            for name in names)}
+        output = StringIO()
+        envelope = write_multipart(output, boundary='==dump==')
+        dump.dump_docs(envelope, FakeDatabase(), [doc], workers=2)
+        envelope.close()
+        output.seek(0)
+        for headers, is_multipart, payload in read_multipart(output):
+            parts = [(dict(h), p) for h, _, p in payload][1:]
+        self.assertEqual(sorted(h['content-id'] for h, p in parts), names)
+        for headers, payload in parts:
+            self.assertEqual(payload, headers['content-id'].encode('ascii') * 3)
+
+    def test_documents_not_modified(self):
+        doc = {'_id': 'foo', '_rev': '1-abc', '_attachments': {
+            'a.txt': {'content_type': 'text/plain', 'data': 'YQ=='}}}
+        parts = self._dump([doc])
+        self.assertEqual(json.decode(parts[0][2][0][1].decode('utf-8')),
+                         {'_id': 'foo', '_rev': '1-abc'})
+        self.assertTrue('_attachments' in doc)
+
+    def test_attachment_stubs_streamed(self):
+        class FakeDatabase(object):
+            def get_attachment(self, doc, name, default=None):
+                if name == 'empty.bin':
+                    return None
+                if name == 'deleted.bin':
+                    return default
+                return StringIO(b'x' * 100000)
+        parts = self._dump([
+            Document(_id='foo', _rev='1-abc', _attachments={
+                'big.bin': {'content_type': 'application/octet-stream',
+                            'length': 100000, 'stub': True},
+                'empty.bin': {'content_type': 'application/octet-stream',
+                              'length': 0, 'stub': True},
+                'deleted.bin': {'content_type': 'application/octet-stream',
+                                'length': 10, 'stub': True}}),
+        ], FakeDatabase())
+        attachments = dict((h['content-id'], (h, p))
+                           for h, p in parts[0][2][1:])
+        headers, payload = attachments['big.bin']
+        self.assertEqual(headers['content-length'], '100000')
+        self.assertEqual(payload, b'x' * 100000)
+        self.assertEqual(attachments['empty.bin'][1], b'')
+        # Deleted since the document was listed, so left out.
+        self.assertFalse('deleted.bin' in attachments)
+
+
+class PrefetchTestCase(unittest.TestCase):
+
+    def test_items_in_order(self):
+        self.assertEqual(list(dump._prefetch(iter(range(10)), 3)),
+                         list(range(10)))
+
+    def test_error_propagated(self):
+        def failing():
+            yield 1
+            raise ValueError('boom')
+        items = dump._prefetch(failing(), 3)
+        self.assertEqual(next(items), 1)
+        self.assertRaises(ValueError, next, items)
+
+    def test_stops_when_closed(self):
+        import threading
+        before = set(threading.enumerate())
+        items = dump._prefetch(iter(range(100)), 2)
+        self.assertEqual(next(items), 0)
+        producers = set(threading.enumerate()) - before
+        items.close()
+        for thread in producers:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+
+class FakeDatabase(object):
+
+    def get_attachment(self, doc, name, default=None):
+        return StringIO(b'stub data of ' + name.encode('ascii'))
+
+
+def _docs_with_attachments():
+    data = b64encode(b'inline data').decode('ascii')
+    return [
+        {'_id': 'plain', '_rev': '1-a', 'n': 1},
+        {'_id': 'attached', '_rev': '2-b', '_attachments': {
+            'inline.txt': {'content_type': 'text/plain', 'data': data},
+            'stub.bin': {'content_type': 'application/octet-stream',
+                         'stub': True, 'length': 21}}},
+    ]
+
+
+class LoadDocsTestCase(unittest.TestCase):
+
+    def test_multipart_round_trip(self):
+        output = StringIO()
+        envelope = write_multipart(output, boundary='==dump==')
+        dump.dump_docs(envelope, FakeDatabase(), _docs_with_attachments())
+        envelope.close()
+        output.seek(0)
+        docs = dict(load._read_docs(output))
+        self.assertEqual(docs['plain'], {'_id': 'plain', '_rev': '1-a',
+                                         'n': 1})
+        attachments = docs['attached']['_attachments']
+        self.assertEqual(attachments['inline.txt']['data'],
+                         b64encode(b'inline data').decode('ascii'))
+        self.assertEqual(attachments['stub.bin']['data'],
+                         b64encode(b'stub data of stub.bin').decode('ascii'))
+        self.assertEqual(attachments['stub.bin']['content_type'],
+                         'application/octet-stream')
+
+    def _dump_stub(self, info):
+        output = StringIO()
+        envelope = write_multipart(output, boundary='==dump==')
+        info = dict(info, content_type='application/octet-stream', stub=True)
+        dump.dump_docs(envelope, FakeDatabase(), [
+            {'_id': 'attached', '_rev': '1-a',
+             '_attachments': {'stub.bin': info}}])
+        envelope.close()
+        return output.getvalue()
+
+    def test_truncated_stream_part(self):
+        data = self._dump_stub({'length': 21})
+        data = data[:data.index(b'stub data of') + 10]
+        self.assertRaises(ValueError, list, load._read_docs(StringIO(data)))
+
+    def test_corrupted_stream_part(self):
+        digest = b64encode(md5(b'stub data of stub.bin').digest())
+        data = self._dump_stub({'length': 21,
+                                'digest': 'md5-' + digest.decode('ascii')})
+        self.assertEqual(len(list(load._read_docs(StringIO(data)))), 1)
+        data = data.replace(b'stub data of', b'stub DATA of')
+        self.assertRaises(ValueError, list, load._read_docs(StringIO(data)))
+
+    def test_empty_input(self):
+        self.assertEqual(list(load._read_docs(StringIO(b''))), [])
+
+    def test_msgpack_missing(self):
+        saved = sys.modules.get('msgpack')
+        sys.modules['msgpack'] = None # makes importing it fail
+        try:
+            self.assertRaises(load.DumpFormatError, load._read_docs,
+                              StringIO(b'\x81\xa2id\xa3foo'))
+        finally:
+            if saved is None:
+                del sys.modules['msgpack']
+            else:
+                sys.modules['msgpack'] = saved
+
+    def test_dump_msgpack_missing(self):
+        saved = sys.modules.get('msgpack')
+        sys.modules['msgpack'] = None # makes importing it fail
+        try:
+            self.assertRaises(ImportError, dump.dump_docs_msgpack,
+                              StringIO(), FakeDatabase(), [])
+        finally:
+            if saved is None:
+                del sys.modules['msgpack']
+            else:
+                sys.modules['msgpack'] = saved
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MsgpackDumpTestCase(unittest.TestCase):
+
+    def _round_trip(self, docs):
+        output = StringIO()
+        dump.dump_docs_msgpack(output, FakeDatabase(), docs)
+        output.seek(0)
+        return dict(load._read_docs(output))
+
+    def test_round_trip(self):
+        docs = self._round_trip(_docs_with_attachments())
+        self.assertEqual(docs['plain'], {'_id': 'plain', '_rev': '1-a',
+                                         'n': 1})
+        attachments = docs['attached']['_attachments']
+        self.assertEqual(attachments['inline.txt'], {
+            'data': b64encode(b'inline data').decode('ascii'),
+            'content_type': 'text/plain'})
+        self.assertEqual(attachments['stub.bin'], {
+            'data': b64encode(b'stub data of stub.bin').decode('ascii'),
+            'content_type': 'application/octet-stream'})
+
+    def test_legacy_content_type(self):
+        docs = self._round_trip([{'_id': 'old', '_rev': '1-a',
+                                  '_attachments': {'old.txt': {
+                                      'content-type': 'text/plain',
+                                      'stub': True}}}])
+        attachment = docs['old']['_attachments']['old.txt']
+        self.assertEqual(attachment['content_type'], 'text/plain')
+
+
+class CheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'dump.checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_no_checkpoint(self):
+        self.assertEqual(dump._read_checkpoint(self.path), None)
+
+    def test_checkpoint_after_written(self):
+        docs = [{'_id': 'doc%d' % i} for i in range(5)]
+        seen = []
+        for doc in dump._checkpoint(iter(docs), StringIO(), self.path, 2):
+            seen.append((doc['_id'], dump._read_checkpoint(self.path)))
+        self.assertEqual(seen, [('doc0', None), ('doc1', None),
+                                ('doc2', 'doc1'), ('doc3', 'doc1'),
+                                ('doc4', 'doc3')])
+        self.assertEqual(dump._read_checkpoint(self.path), 'doc4')
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_rows_after_checkpointed(self):
+        rows = [{'id': 'doc1'}, {'id': 'doc2'}]
+        self.assertEqual(list(dump._rows_after(rows, 'doc1')),
+                         [{'id': 'doc2'}])
+
+    def test_rows_after_deleted(self):
+        # The checkpointed document is gone, nothing may be skipped.
+        rows = [{'id': 'doc2'}, {'id': 'doc3'}]
+        self.assertEqual(list(dump._rows_after(rows, 'doc1')), rows)
+        self.assertEqual(list(dump._rows_after([], 'doc1')), [])
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(ToolLoadTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(DumpDocsTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(PrefetchTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(CheckpointTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(LoadDocsTestCase, 'test'))
+    suite.addTest(unittest.makeSuite(MsgpackDumpTestCase, 'test'))
     return suite
 
 
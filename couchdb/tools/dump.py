@@ -14,51 +14,276 @@ file.
 from __future__ import print_function
 from base64 import b64decode
 from optparse import OptionParser
+import os
 import sys
+import threading
+
+try:
+    from queue import Full, Queue
+except ImportError:
+    from Queue import Full, Queue
 
 from couchdb import __version__ as VERSION
-from couchdb import json
+from couchdb import json, util
 from couchdb.client import Database
 from couchdb.multipart import write_multipart
 
 BULK_SIZE = 1000
+# Documents are encoded to UTF-8 up front, so the charset is stated here.
+JSON_CONTENT_TYPE = 'application/json;charset=utf-8'
+# Number of attachments of a single document that are fetched concurrently.
+ATTACHMENT_WORKERS = 8
+# Seconds between checks of the prefetching thread whether it should stop.
+PREFETCH_POLL_INTERVAL = 0.1
+# Returned for attachments deleted since the document was listed, as opposed
+# to None for empty ones.
+_MISSING = object()
 
-def dump_docs(envelope, db, docs):
-    for doc in docs:
+def _attachment_pool(doc, workers):
+    # Only start threads once a document has several attachment stubs.
+    attachments = doc.get('_attachments') or {}
+    if sum(1 for info in attachments.values() if 'data' not in info) > 1:
+        from multiprocessing.pool import ThreadPool
+        return ThreadPool(workers)
+
+
+def _open_attachments(db, doc_id, names, pool):
+    """Request the given attachments of a document, concurrently if a thread
+    pool is given. Small attachments arrive complete; larger ones are returned
+    as open response streams that are read as they are written out.
+    """
+    get = lambda name: db.get_attachment(doc_id, name, default=_MISSING)
+    if pool is None or len(names) < 2:
+        return [get(name) for name in names]
+    return pool.map(get, names)
+
+
+def _warn_missing(doc_id, name):
+    print('Warning: attachment %r of document %r was deleted during the dump, '
+          'skipping it' % (name, doc_id), file=sys.stderr)
+
+
+def _dump_doc(envelope, db, doc, pool, workers):
+    doc_id, doc_rev = doc['_id'], doc['_rev']
+    attachments = doc.get('_attachments')
+    if attachments:
+        # The attachments are written as separate parts, so leave them
+        # out of the JSON without modifying the caller's document.
+        doc = dict(doc)
+        del doc['_attachments']
+    jsondoc = json.encode_bytes(doc)
+    headers = {'Content-ID': doc_id, 'ETag': '"%s"' % doc_rev}
+
+    if not attachments:
+        envelope.add(JSON_CONTENT_TYPE, jsondoc, headers)
+        return
+
+    parts = envelope.open(headers)
+    parts.add(JSON_CONTENT_TYPE, jsondoc)
+    items = list(attachments.items())
+    # Fetch stubs in groups of `workers`, so that at most that many
+    # responses are open at the same time.
+    for start in range(0, len(items), workers):
+        group = items[start:start + workers]
+        stubs = [name for name, info in group if 'data' not in info]
+        streams = dict(zip(stubs, _open_attachments(db, doc_id, stubs, pool)))
+        for name, info in group:
 
-        print('Dumping document %r' % doc.id, file=sys.stderr)
-        attachments = doc.pop('_attachments', {})
-        jsondoc = json.encode(doc)
+            content_type = info.get('content_type')
+            if content_type is None: # CouchDB < 0.8
+                content_type = info.get('content-type')
 
-        if attachments:
-            parts = envelope.open({
-                'Content-ID': doc.id,
-                'ETag': '"%s"' % doc.rev
-            })
-            parts.add('application/json', jsondoc)
-            for name, info in attachments.items():
+            if 'data' not in info:
+                # Copy the attachment from the response in chunks.
+                stream = streams[name]
+                if stream is _MISSING:
+                    _warn_missing(doc_id, name)
+                    continue
+                if stream is None: # empty attachment
+                    stream = util.StringIO()
+                part_headers = {'Content-ID': name}
+                # The digest of an encoded attachment is not the one of the
+                # content as fetched, so it is only used for plain ones.
+                digest = info.get('digest', '')
+                if digest.startswith('md5-') and 'encoding' not in info:
+                    part_headers['Content-MD5'] = digest[4:]
+                parts.add_stream(content_type, stream, part_headers,
+                                 length=info.get('length'))
+            else:
+                # Inline data is already base64 encoded, pass it through.
+                parts.add(content_type, info['data'].encode('ascii'), {
+                    'Content-ID': name,
+                    'Content-Transfer-Encoding': 'base64'
+                })
 
+    parts.close()
+
+
+def dump_docs(envelope, db, docs, workers=ATTACHMENT_WORKERS, verbose=False):
+    pool = None
+    try:
+        for doc in docs:
+            if verbose:
+                print('Dumping document %r' % doc['_id'], file=sys.stderr)
+            if pool is None and workers > 1:
+                pool = _attachment_pool(doc, workers)
+            _dump_doc(envelope, db, doc, pool, workers)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _import_msgpack():
+    # msgpack is optional, only needed for the msgpack format.
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError('the msgpack format requires the msgpack module')
+    return msgpack
+
+
+def dump_docs_msgpack(output, db, docs, verbose=False):
+    """Write the documents as a stream of MessagePack maps, one per document,
+    with the attachments included as binary data.
+    """
+    msgpack = _import_msgpack()
+    packer = msgpack.Packer(use_bin_type=True)
+    for doc in docs:
+        doc_id, doc_rev = doc['_id'], doc['_rev']
+        if verbose:
+            print('Dumping document %r' % doc_id, file=sys.stderr)
+        attachments = []
+        if doc.get('_attachments'):
+            for name, info in doc['_attachments'].items():
+                if 'data' in info:
+                    data = b64decode(info['data'])
+                else:
+                    stream = db.get_attachment(doc_id, name,
+                                               default=_MISSING)
+                    if stream is _MISSING:
+                        _warn_missing(doc_id, name)
+                        continue
+                    data = stream.read() if stream is not None else b''
                 content_type = info.get('content_type')
                 if content_type is None: # CouchDB < 0.8
                     content_type = info.get('content-type')
+                attachments.append({
+                    'name': name,
+                    'content_type': content_type,
+                    'data': data
+                })
+            doc = dict(doc)
+            del doc['_attachments']
+        output.write(packer.pack({'id': doc_id, 'rev': doc_rev, 'doc': doc,
+                                  'attachments': attachments}))
 
-                if 'data' not in info:
-                    data = db.get_attachment(doc, name).read()
-                else:
-                    data = b64decode(info['data'])
 
-                parts.add(content_type, data, {'Content-ID': name})
+def _prefetch(iterable, size):
+    """Iterate over `iterable` in a background thread, keeping up to `size`
+    items ready, so that fetching the next items overlaps with processing the
+    current ones.
+
+    The background thread stops when the returned generator is closed or
+    garbage collected, even if the consumer stops before the end.
+    """
+    queue = Queue(size)
+    stopped = threading.Event()
 
-            parts.close()
+    def put(item):
+        # Give up once the consumer is gone, rather than block forever.
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=PREFETCH_POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
 
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+        except Exception as e:
+            put((False, e))
         else:
-            envelope.add('application/json', jsondoc, {
-                'Content-ID': doc.id,
-                'ETag': '"%s"' % doc.rev
-            })
+            put((False, None))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            ok, item = queue.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                break
+            yield item
+    finally:
+        stopped.set()
+
+
+def _read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as fileobj:
+        return json.decode(fileobj.read())['last_id']
+
+
+def _write_checkpoint(path, last_id):
+    # Write to a temporary file first, so that an interrupted write never
+    # leaves a truncated checkpoint behind.
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fileobj:
+        fileobj.write(json.encode({'last_id': last_id}))
+    getattr(os, 'replace', os.rename)(tmp, path)
+
+
+def _checkpoint(docs, output, path, interval):
+    """Pass the documents through, recording the ID of the last document
+    written in the file at `path` every `interval` documents and at the end.
+
+    A document has been written once the next one is requested, so the
+    checkpoint is taken just before yielding the next document.
+    """
+    last_id = None
+    for count, doc in enumerate(docs):
+        if count and count % interval == 0:
+            output.flush()
+            _write_checkpoint(path, last_id)
+        yield doc
+        last_id = doc['_id']
+    if last_id is not None:
+        output.flush()
+        _write_checkpoint(path, last_id)
+
+
+def _rows_after(rows, last_id):
+    """Drop the first of the rows if it is the document `last_id`. That
+    document may have been deleted since it was checkpointed, in which case
+    the rows already start with the next one.
+    """
+    rows = iter(rows)
+    for row in rows:
+        if row['id'] != last_id:
+            yield row
+        break
+    for row in rows:
+        yield row
+
 
 def dump_db(dburl, username=None, password=None, boundary=None,
-            output=None, bulk_size=BULK_SIZE):
+            output=None, bulk_size=BULK_SIZE, format='multipart',
+            resume=None, verbose=False):
+    """Dump the documents of a database to `output`.
+
+    If `resume` names a checkpoint file, the ID of the last document written
+    is recorded there after every batch. When the file already exists, only
+    the documents after the recorded one are dumped, so an interrupted dump
+    can be completed by a second one.
+    """
 
     if output is None:
         output = sys.stdout if sys.version_info[0] < 3 else sys.stdout.buffer
@@ -67,22 +292,46 @@ def dump_db(dburl, username=None, password=None, boundary=None,
     if username is not None and password is not None:
         db.resource.credentials = username, password
 
-    envelope = write_multipart(output, boundary=boundary)
-    start, num = 0, db.info()['doc_count']
-    while start < num:
-        opts = {'limit': bulk_size, 'skip': start, 'include_docs': True}
-        docs = (row.doc for row in db.view('_all_docs', **opts))
-        dump_docs(envelope, db, docs)
-        start += bulk_size
+    if format not in ('multipart', 'msgpack'):
+        raise ValueError('unsupported dump format %r' % format)
+
+    # Page through _all_docs by key rather than with skip, which CouchDB
+    # implements by scanning all the skipped rows.
+    # The next batch is fetched while the current one is being written.
+    # Documents come with attachment stubs only (attachments=true is never
+    # passed), the contents are fetched separately when writing them out.
+    last_id = None
+    if resume is not None:
+        last_id = _read_checkpoint(resume)
+    if last_id is not None:
+        rows = _rows_after(db.iterview('_all_docs', bulk_size,
+                                       include_docs=True, startkey=last_id),
+                           last_id)
+    else:
+        rows = db.iterview('_all_docs', bulk_size, include_docs=True)
+    # Row.doc would copy every document into a Document, use the dicts as is.
+    prefetched = _prefetch(rows, bulk_size)
+    docs = (row['doc'] for row in prefetched)
+    if resume is not None:
+        docs = _checkpoint(docs, output, resume, bulk_size)
 
-    envelope.close()
+    try:
+        if format == 'msgpack':
+            dump_docs_msgpack(output, db, docs, verbose=verbose)
+        else:
+            envelope = write_multipart(output, boundary=boundary)
+            dump_docs(envelope, db, docs, verbose=verbose)
+            envelope.close()
+    finally:
+        # Stop prefetching if the dump failed halfway.
+        prefetched.close()
 
 
 def main():
     parser = OptionParser(usage='%prog [options] dburl', version=VERSION)
     parser.add_option('--json-module', action='store', dest='json_module',
                       help='the JSON module to use ("simplejson", "cjson", '
-                            'or "json" are supported)')
+                            '"orjson" or "json" are supported)')
     parser.add_option('-u', '--username', action='store', dest='username',
                       help='the username to use for authentication')
     parser.add_option('-p', '--password', action='store', dest='password',
@@ -90,17 +339,38 @@ def main():
     parser.add_option('-b', '--bulk-size', action='store', dest='bulk_size',
                       type='int', default=BULK_SIZE,
                       help='number of docs retrieved from database')
+    parser.add_option('--format', action='store', dest='format',
+                      type='choice', choices=['multipart', 'msgpack'],
+                      default='multipart',
+                      help='the dump format, "multipart" (MIME with JSON '
+                           'documents, the default) or "msgpack" (requires '
+                           'the msgpack module)')
+    parser.add_option('--resume', action='store', dest='resume',
+                      metavar='FILE',
+                      help='record progress in FILE, and if it exists, only '
+                           'dump the documents after the last one recorded '
+                           '(write the output of a resumed dump to a new '
+                           'file)')
+    parser.add_option('-v', '--verbose', action='store_true', dest='verbose',
+                      help='print the ID of every document dumped to stderr')
     parser.set_defaults()
     options, args = parser.parse_args()
 
     if len(args) != 1:
         return parser.error('incorrect number of arguments')
 
+    if options.format == 'msgpack':
+        try:
+            _import_msgpack()
+        except ImportError as e:
+            return parser.error(str(e))
+
     if options.json_module:
         json.use(options.json_module)
 
     dump_db(args[0], username=options.username, password=options.password,
-            bulk_size=options.bulk_size)
+            bulk_size=options.bulk_size, format=options.format,
+            resume=options.resume, verbose=options.verbose)
 
 
 if __name__ == '__main__':
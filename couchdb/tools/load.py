@@ -13,21 +13,18 @@ file.
 
 from __future__ import print_function
 from base64 import b64encode
+import itertools
 from optparse import OptionParser
 import sys
 
 from couchdb import __version__ as VERSION
 from couchdb import json
 from couchdb.client import Database
-from couchdb.multipart import read_multipart
+from couchdb.multipart import CHUNK_SIZE, read_multipart
 
 
-def load_db(fileobj, dburl, username=None, password=None, ignore_errors=False):
-    db = Database(dburl)
-    if username is not None and password is not None:
-        db.resource.credentials = (username, password)
-
-    for headers, is_multipart, payload in read_multipart(fileobj):
+def _read_multipart_docs(lines):
+    for headers, is_multipart, payload in read_multipart(lines):
         docid = headers['content-id']
 
         if is_multipart: # doc has attachments
@@ -35,6 +32,12 @@ def load_db(fileobj, dburl, username=None, password=None, ignore_errors=False):
                 if 'content-id' not in headers:
                     doc = json.decode(payload)
                     doc['_attachments'] = {}
+                elif headers.get('content-transfer-encoding') == 'base64':
+                    # Inline attachment data, already encoded by the dump.
+                    doc['_attachments'][headers['content-id']] = {
+                        'data': payload.decode('ascii'),
+                        'content_type': headers['content-type']
+                    }
                 else:
                     doc['_attachments'][headers['content-id']] = {
                         'data': b64encode(payload).decode('ascii'),
@@ -45,6 +48,54 @@ def load_db(fileobj, dburl, username=None, password=None, ignore_errors=False):
         else: # no attachments, just the JSON
             doc = json.decode(payload)
 
+        yield docid, doc
+
+
+class DumpFormatError(ValueError):
+    """Raised when the input is not a dump that can be read."""
+
+
+def _read_msgpack_docs(msgpack, first, fileobj):
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(first)
+    while True:
+        for frame in unpacker:
+            doc = frame['doc']
+            if frame['attachments']:
+                doc['_attachments'] = dict((att['name'], {
+                    'data': b64encode(att['data']).decode('ascii'),
+                    'content_type': att['content_type']
+                }) for att in frame['attachments'])
+            yield frame['id'], doc
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        unpacker.feed(chunk)
+
+
+def _read_docs(fileobj):
+    """Read the documents of a dump in either format, telling them apart by
+    the first line: multipart dumps start with a ``Content-Type`` header.
+    """
+    first = fileobj.readline()
+    if not first:
+        return iter([])
+    if first.lower().startswith(b'content-type:'):
+        return _read_multipart_docs(itertools.chain([first], fileobj))
+    try:
+        import msgpack
+    except ImportError:
+        raise DumpFormatError('the input is not a multipart dump, and reading '
+                              'a msgpack dump requires the msgpack module')
+    return _read_msgpack_docs(msgpack, first, fileobj)
+
+
+def load_db(fileobj, dburl, username=None, password=None, ignore_errors=False):
+    db = Database(dburl)
+    if username is not None and password is not None:
+        db.resource.credentials = (username, password)
+
+    for docid, doc in _read_docs(fileobj):
         del doc['_rev']
         print('Loading document %r' % docid, file=sys.stderr)
         try:
@@ -65,7 +116,7 @@ def main():
                            'and continue with the remaining documents')
     parser.add_option('--json-module', action='store', dest='json_module',
                       help='the JSON module to use ("simplejson", "cjson", '
-                            'or "json" are supported)')
+                            '"orjson" or "json" are supported)')
     parser.add_option('-u', '--username', action='store', dest='username',
                       help='the username to use for authentication')
     parser.add_option('-p', '--password', action='store', dest='password',
@@ -79,13 +130,16 @@ def main():
     if options.input != '-':
         fileobj = open(options.input, 'rb')
     else:
-        fileobj = sys.stdin
+        fileobj = getattr(sys.stdin, 'buffer', sys.stdin)
 
     if options.json_module:
         json.use(options.json_module)
 
-    load_db(fileobj, args[0], username=options.username,
-            password=options.password, ignore_errors=options.ignore_errors)
+    try:
+        load_db(fileobj, args[0], username=options.username,
+                password=options.password, ignore_errors=options.ignore_errors)
+    except DumpFormatError as e:
+        return parser.error(str(e))
 
 
 if __name__ == '__main__':
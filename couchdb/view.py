@@ -171,7 +171,7 @@ Options:
   --version             display version information and exit
   -h, --help            display a short help message and exit
   --json-module=<name>  set the JSON module to use ('simplejson', 'cjson',
-                        or 'json' are supported)
+                        'orjson' or 'json' are supported)
   --log-file=<file>     name of the file to write log messages to, or '-' to
                         enable logging to the standard error stream
   --debug               enable debug logging; requires --log-file to be
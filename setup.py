@@ -32,6 +32,10 @@ else:
             ],
         },
         'install_requires': [],
+        'extras_require': {
+            'orjson': ['orjson; python_version >= "3.6"'],
+            'msgpack': ['msgpack'],
+        },
         'test_suite': 'couchdb.tests.__main__.suite',
         'zip_safe': True,
     }